@@ -1,13 +1,19 @@
 import re
-from typing import Dict, Tuple
+import time
+from typing import Dict, Optional, Tuple
 from openai_service import OpenAIService
+from router import ResponseRouter, QUESTION, TEMPLATE, LLM, ESCALATE
+from conversation import ConversationHistory, CUSTOMER, AGENT
+import metrics
 
 class EmailAgent:
-    def __init__(self, db, rag, gmail):
+    def __init__(self, db, rag, gmail, openai=None, router=None):
         self.db = db
         self.rag = rag
         self.gmail = gmail
-        self.openai = OpenAIService()
+        self.openai = openai or OpenAIService()
+        self.router = router or ResponseRouter()
+        self.history = ConversationHistory(db)
     
     def categorize_email(self, email_body: str) -> str:
         """Simple keyword-based categorization"""
@@ -42,58 +48,105 @@ class EmailAgent:
     
     def process_email(self, email: Dict):
         """Main email processing logic"""
-        category = self.categorize_email(email['body'])
-        
-        if category == 'QUESTION':
-            self.handle_question(email)
-        elif category == 'REFUND':
-            self.handle_refund(email)
-        else:
-            self.handle_other(email)
-    
-    def handle_question(self, email: Dict):
-        """Handle question emails using AI + RAG fallback"""
-        # Try OpenAI first
-        if self.openai.is_available():
-            # Get knowledge base info as context
-            rag_answer, _ = self.rag.find_answer(email['body'])
+        start = time.perf_counter()
+        category = 'none'
+        outcome = 'error'
+        try:
+            category = self.categorize_email(email['body'])
+            # Timed here so the stage is labelled with the category it produced
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage='classify', category=category)
             
+            with metrics.email_labels(category=category):
+                if category == 'QUESTION':
+                    outcome = self.handle_question(email)
+                elif category == 'REFUND':
+                    outcome = self.handle_refund(email)
+                else:
+                    outcome = self.handle_other(email)
+        finally:
+            metrics.EMAILS.inc(category=category, outcome=outcome)
+            metrics.EMAIL_SECONDS.observe(time.perf_counter() - start, category=category, outcome=outcome)
+    
+    def send_response(self, email: Dict, category: str, ai_response: Optional[str], template: str) -> str:
+        """Reply with the AI response, or the template when there is none,
+        and add the exchange to the thread's history.
+        
+        Returns the outcome ('llm', 'template', or 'unsent' when the reply
+        could not be sent) for metrics.
+        """
+        reply = ai_response or template
+        sent = self.gmail.send_reply(
+            email['from'],
+            email['subject'],
+            reply,
+            email['thread_id']
+        )
+        
+        # Noreply senders get no history; an undelivered reply is not a turn
+        if self.gmail.can_reply(email['from']):
+            turns = [(CUSTOMER, email['body'])]
+            if sent:
+                turns.append((AGENT, reply))
+            self.history.append(email['thread_id'], email['from'], category, turns)
+        
+        if not sent:
+            return 'unsent'
+        return 'llm' if ai_response else 'template'
+    
+    def respond(self, email: Dict, case: str, template: str, generate) -> str:
+        """Reply to a fixed refund case with its template, or with generate() if routed to the LLM"""
+        ai_response = None
+        if self.router.route(case, self.openai.is_available()) == LLM:
+            ai_response = generate()
+        # An empty LLM reply falls back to the template
+        self.router.record(case, LLM if ai_response else TEMPLATE)
+        return self.send_response(email, 'REFUND', ai_response, template)
+    
+    def conversation_history(self, email: Dict, note: str) -> str:
+        """Stored history of the email's thread plus a note on the current situation"""
+        summary, turns = self.history.load(email['thread_id'])
+        history = self.history.format(summary, turns)
+        return f"{history}\n\n{note}" if history else note
+    
+    def handle_question(self, email: Dict) -> str:
+        """Handle question emails, routed on knowledge base confidence"""
+        answer, confidence = self.rag.find_answer(email['body'])
+        if not answer:
+            confidence = 0.0
+        
+        route = self.router.route(QUESTION, self.openai.is_available(), confidence)
+        
+        if route == LLM:
             ai_response = self.openai.generate_question_response(
                 email['body'], 
-                knowledge_base_info=rag_answer
+                knowledge_base_info=answer
             )
-            
             if ai_response:
-                self.gmail.send_reply(
-                    email['from'],
-                    email['subject'],
-                    ai_response,
-                    email['thread_id']
-                )
-                return
+                self.router.record(QUESTION, LLM)
+                return self.send_response(email, 'QUESTION', ai_response, None)
+            # LLM failed, fall back to the knowledge base answer if there is one
+            route = TEMPLATE if answer else ESCALATE
         
-        # Fallback to template-based response
-        answer, confidence = self.rag.find_answer(email['body'])
-        
-        if answer:
-            # Send template response
-            self.gmail.send_reply(
-                email['from'],
-                email['subject'],
-                f"Thank you for your question.\n\n{answer}\n\nBest regards,\nCustomer Support",
-                email['thread_id']
-            )
-        else:
-            # Save as unhandled with high importance
-            self.db.save_unhandled_email(
-                email['from'],
-                email['subject'],
-                email['body'],
+        self.router.record(QUESTION, route)
+        if route == TEMPLATE:
+            return self.send_response(
+                email,
                 'QUESTION',
-                'HIGH'
+                None,
+                f"Thank you for your question.\n\n{answer}\n\nBest regards,\nCustomer Support"
             )
+        
+        # Escalate: save as unhandled with high importance
+        self.db.save_unhandled_email(
+            email['from'],
+            email['subject'],
+            email['body'],
+            'QUESTION',
+            'HIGH'
+        )
+        return 'unhandled'
     
-    def handle_refund(self, email: Dict):
+    def handle_refund(self, email: Dict) -> str:
         """Handle refund requests"""
         order_id = self.extract_order_id(email['body'])
         
@@ -101,123 +154,102 @@ class EmailAgent:
         context = self.get_conversation_context(email['thread_id'])
         
         if not order_id:
+            metrics.ORDERS.inc(result='missing')
+            
             # Check if we were already waiting for order ID
             if context and 'awaiting_order_id' in context:
                 # User replied with something that's not an order ID
                 self.db.save_not_found_refund(email['from'], None, email['body'])
                 
-                # Generate AI response or use template
-                if self.openai.is_available():
-                    ai_response = self.openai.generate_refund_response(
+                return self.respond(
+                    email,
+                    'refund_missing_order_id',
+                    "I couldn't find a valid order ID in your message. Please provide your order ID in the format ORD-XXXXX.",
+                    lambda: self.openai.generate_refund_response(
                         context="Customer didn't provide order ID after being asked", 
                         order_id=None, 
                         order_found=None
                     )
-                    response_text = ai_response if ai_response else "I couldn't find a valid order ID in your message. Please provide your order ID in the format ORD-XXXXX."
-                else:
-                    response_text = "I couldn't find a valid order ID in your message. Please provide your order ID in the format ORD-XXXXX."
-                
-                self.gmail.send_reply(
-                    email['from'],
-                    email['subject'],
-                    response_text,
-                    email['thread_id']
                 )
-                return
             
             # First refund request - ask for order ID
-            if self.openai.is_available():
-                ai_response = self.openai.generate_refund_response(
+            outcome = self.respond(
+                email,
+                'refund_request',
+                "Thank you for contacting us about a refund. Please provide your order ID (format: ORD-XXXXX) so we can process your request.",
+                lambda: self.openai.generate_refund_response(
                     context=email['body'],
                     order_id=None,
                     order_found=None
                 )
-                response_text = ai_response if ai_response else "Thank you for contacting us about a refund. Please provide your order ID (format: ORD-XXXXX) so we can process your request."
-            else:
-                response_text = "Thank you for contacting us about a refund. Please provide your order ID (format: ORD-XXXXX) so we can process your request."
-            
-            self.gmail.send_reply(
-                email['from'],
-                email['subject'],
-                response_text,
-                email['thread_id']
             )
             # Update context
             self.update_conversation_context(email['thread_id'], email['from'], 'REFUND', 'awaiting_order_id')
-        else:
-            order = self.db.get_order(order_id)
+            return outcome
+        
+        order = self.db.get_order(order_id)
+        
+        if order:
+            metrics.ORDERS.inc(result='found')
             
-            if order:
-                # Process refund
-                self.db.mark_refund_requested(order_id)
-                
-                # Generate AI response or use template
-                if self.openai.is_available():
-                    ai_response = self.openai.generate_refund_response(
-                        context=f"Refund approved for order {order_id}",
-                        order_id=order_id,
-                        order_found=True
-                    )
-                    response_text = ai_response if ai_response else f"Your refund for order {order_id} has been approved and will be processed within 3 days."
-                else:
-                    response_text = f"Your refund for order {order_id} has been approved and will be processed within 3 days."
-                
-                self.gmail.send_reply(
-                    email['from'],
-                    email['subject'],
-                    response_text,
-                    email['thread_id']
+            # Process refund
+            self.db.mark_refund_requested(order_id)
+            
+            outcome = self.respond(
+                email,
+                'refund_approved',
+                f"Your refund for order {order_id} has been approved and will be processed within 3 days.",
+                lambda: self.openai.generate_refund_response(
+                    context=f"Refund approved for order {order_id}",
+                    order_id=order_id,
+                    order_found=True
                 )
-                # Clear context after successful processing
-                self.update_conversation_context(email['thread_id'], email['from'], 'REFUND', 'completed')
-            else:
-                # Check if this is a repeated invalid ID
-                invalid_order_key = f'invalid_order_{order_id}'
-                if context and invalid_order_key in context:
-                    # Second time with same invalid ID
-                    self.db.save_not_found_refund(email['from'], order_id, email['body'])
-                    
-                    if self.openai.is_available():
-                        ai_response = self.openai.generate_follow_up_response(
-                            f"Customer repeatedly provided invalid order ID {order_id}",
-                            email['body']
-                        )
-                        response_text = ai_response if ai_response else f"Order ID {order_id} is still not found in our system. Your request has been logged for manual review."
-                    else:
-                        response_text = f"Order ID {order_id} is still not found in our system. Your request has been logged for manual review."
-                    
-                    self.gmail.send_reply(
-                        email['from'],
-                        email['subject'],
-                        response_text,
-                        email['thread_id']
-                    )
-                else:
-                    # First time with this invalid ID
-                    if self.openai.is_available():
-                        ai_response = self.openai.generate_refund_response(
-                            context=f"Order ID {order_id} not found in system",
-                            order_id=order_id,
-                            order_found=False
-                        )
-                        response_text = ai_response if ai_response else f"Order ID {order_id} not found. Please check and provide the correct order ID."
-                    else:
-                        response_text = f"Order ID {order_id} not found. Please check and provide the correct order ID."
-                    
-                    self.gmail.send_reply(
-                        email['from'],
-                        email['subject'],
-                        response_text,
-                        email['thread_id']
-                    )
-                    self.update_conversation_context(
-                        email['thread_id'], 
-                        email['from'], 
-                        'REFUND', 
-                        invalid_order_key
-                    )
+            )
+            # Clear context after successful processing
+            self.update_conversation_context(email['thread_id'], email['from'], 'REFUND', 'completed')
+            return outcome
+        
+        metrics.ORDERS.inc(result='not_found')
+        
+        # Check if this is a repeated invalid ID
+        invalid_order_key = f'invalid_order_{order_id}'
+        if context and invalid_order_key in context:
+            # Second time with same invalid ID
+            self.db.save_not_found_refund(email['from'], order_id, email['body'])
+            
+            return self.respond(
+                email,
+                'refund_order_not_found_repeat',
+                f"Order ID {order_id} is still not found in our system. Your request has been logged for manual review.",
+                lambda: self.openai.generate_follow_up_response(
+                    self.conversation_history(
+                        email,
+                        f"Customer repeatedly provided invalid order ID {order_id}"
+                    ),
+                    email['body']
+                )
+            )
+        
+        # First time with this invalid ID
+        outcome = self.respond(
+            email,
+            'refund_order_not_found',
+            f"Order ID {order_id} not found. Please check and provide the correct order ID.",
+            lambda: self.openai.generate_refund_response(
+                context=f"Order ID {order_id} not found in system",
+                order_id=order_id,
+                order_found=False
+            )
+        )
+        self.update_conversation_context(
+            email['thread_id'], 
+            email['from'], 
+            'REFUND', 
+            invalid_order_key
+        )
+        return outcome
     
-    def handle_other(self, email: Dict):
+    def handle_other(self, email: Dict) -> str:
         """Handle other/nonsense emails"""
         importance = self.assess_importance(email['body'])
         self.db.save_unhandled_email(
@@ -227,17 +259,20 @@ class EmailAgent:
             'OTHER',
             importance
         )
+        return 'unhandled'
     
+    @metrics.timed_stage('db')
     def get_conversation_context(self, thread_id: str) -> str:
         """Get conversation context from DB"""
         with self.db.conn.cursor() as cur:
             cur.execute(
-                "SELECT context FROM email_conversations WHERE thread_id = %s",
+                "SELECT context FROM email_conversations WHERE thread_id = %s AND closed_at IS NULL",
                 (thread_id,)
             )
             result = cur.fetchone()
             return result[0] if result else None
     
+    @metrics.timed_stage('db')
     def update_conversation_context(self, thread_id: str, email_from: str, category: str, context: str):
         """Update conversation context"""
         with self.db.conn.cursor() as cur:
@@ -247,5 +282,6 @@ class EmailAgent:
                 ON CONFLICT (thread_id) DO UPDATE
                 SET last_category = EXCLUDED.last_category,
                     context = EXCLUDED.context,
-                    updated_at = CURRENT_TIMESTAMP
+                    updated_at = CURRENT_TIMESTAMP,
+                    closed_at = NULL
             """, (thread_id, email_from, category, context))
\ No newline at end of file
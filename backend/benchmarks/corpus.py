@@ -0,0 +1,123 @@
+"""Deterministic corpus of realistic Gmail API messages for benchmarks"""
+import base64
+import random
+
+KINDS = ('short', 'threaded', 'multipart', 'non_ascii')
+
+SENDERS = [
+    'Jane Doe <jane.doe@example.com>',
+    'customer1@example.com',
+    '"Support Fan" <fan+orders@example.org>',
+    'Иван Петров <ivan@example.ru>',
+    'noreply@shop.example.com',
+]
+
+SHORT_BODIES = [
+    "What are your business hours?",
+    "I want a refund for ORD-12345 please.",
+    "How long does shipping take to Canada?",
+    "Hi, can you tell me about your return policy?",
+    "Win a free cruise!!! Click here now",
+    "URGENT: my package never arrived, order ORD-67890",
+    "Thanks, that solved it.",
+    "Which payment methods do you accept?",
+]
+
+FILLER = [
+    "I ordered a pair of shoes last week and they arrived in the wrong size.",
+    "The tracking page has not updated since Monday.",
+    "I have been a loyal customer for years and this is the first problem I have had.",
+    "Could you please check what is going on with my order?",
+    "I also noticed that the invoice lists a different address.",
+    "Please let me know what information you need from me.",
+]
+
+NON_ASCII_BODIES = [
+    "Здравствуйте! Я хочу вернуть товар, заказ ORD-22222. Когда будет возврат денег?",
+    "こんにちは。注文の配送にはどのくらい時間がかかりますか？",
+    "Bonjour, où en est ma commande ? J'aimerais un remboursement rapide, merci.",
+    "Grüße! Können Sie mir sagen, wann meine Bestellung ankommt? 📦🙏",
+    "¿Cuál es su política de devoluciones? Pedido ORD-33333 — gracias.",
+]
+
+def encode(text):
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+def make_message(msg_id, sender, subject, body, html=False):
+    """Build a messages().get() style payload with a text/plain body"""
+    headers = [
+        {'name': 'Delivered-To', 'value': 'support@example.com'},
+        {'name': 'Received', 'value': 'by 2002:a05:6a10:1234 with SMTP id abc; Mon, 1 Jan 2024 10:00:00 -0800'},
+        {'name': 'Date', 'value': 'Mon, 1 Jan 2024 10:00:00 -0800'},
+        {'name': 'From', 'value': sender},
+        {'name': 'To', 'value': 'support@example.com'},
+        {'name': 'Subject', 'value': subject},
+        {'name': 'Message-ID', 'value': f'<{msg_id}@mail.example.com>'},
+        {'name': 'Content-Type', 'value': 'multipart/alternative' if html else 'text/plain; charset="UTF-8"'},
+    ]
+    if html:
+        payload = {
+            'mimeType': 'multipart/alternative',
+            'headers': headers,
+            'body': {'size': 0},
+            'parts': [
+                {
+                    'partId': '0',
+                    'mimeType': 'text/plain',
+                    'headers': [{'name': 'Content-Type', 'value': 'text/plain; charset="UTF-8"'}],
+                    'body': {'size': len(body), 'data': encode(body)},
+                },
+                {
+                    'partId': '1',
+                    'mimeType': 'text/html',
+                    'headers': [{'name': 'Content-Type', 'value': 'text/html; charset="UTF-8"'}],
+                    'body': {'size': len(body), 'data': encode(f'<div dir="ltr"><p>{body}</p></div>')},
+                },
+            ],
+        }
+    else:
+        payload = {
+            'mimeType': 'text/plain',
+            'headers': headers,
+            'body': {'size': len(body), 'data': encode(body)},
+        }
+    return {
+        'id': msg_id,
+        'threadId': f'thread-{msg_id}',
+        'labelIds': ['UNREAD', 'INBOX'],
+        'snippet': body[:100],
+        'payload': payload,
+    }
+
+def threaded_body(rng, depth):
+    """A reply quoting `depth` earlier messages, as mail clients do"""
+    text = rng.choice(SHORT_BODIES)
+    for level in range(1, depth + 1):
+        quote = '> ' * level
+        paragraph = ' '.join(rng.choice(FILLER) for _ in range(4))
+        text += f"\n\nOn Mon, 1 Jan 2024 at 10:0{level % 10} Customer Support <support@example.com> wrote:\n"
+        text += '\n'.join(f'{quote}{line}' for line in paragraph.split('. '))
+    return text
+
+def generate(kind, count, seed=0):
+    """Return `count` messages of the given kind"""
+    rng = random.Random(f'{kind}-{seed}')
+    messages = []
+    for i in range(count):
+        msg_id = f'{kind}-{i:06d}'
+        sender = rng.choice(SENDERS)
+        if kind == 'short':
+            body = rng.choice(SHORT_BODIES)
+            messages.append(make_message(msg_id, sender, 'Question', body))
+        elif kind == 'threaded':
+            body = threaded_body(rng, rng.randint(5, 15))
+            messages.append(make_message(msg_id, sender, 'Re: Re: Re: My order', body))
+        elif kind == 'multipart':
+            body = ' '.join(rng.choice(FILLER + SHORT_BODIES) for _ in range(6))
+            messages.append(make_message(msg_id, sender, 'Order problem', body, html=True))
+        elif kind == 'non_ascii':
+            body = rng.choice(NON_ASCII_BODIES)
+            messages.append(make_message(msg_id, sender, 'Вопрос о заказе', body, html=rng.random() < 0.5))
+        else:
+            raise ValueError(f"Unknown corpus kind: {kind}")
+    return messages
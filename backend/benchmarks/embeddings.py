@@ -0,0 +1,108 @@
+"""Throughput and tail latency of the embedding service vs batch size and max wait.
+
+Concurrent clients each encode one text per request, as SimpleRAG does.
+By default the model is simulated with a fixed per-batch cost plus a
+per-text cost, so the run is offline; --real loads the SentenceTransformer.
+Run from backend/:
+
+    python -m benchmarks.embeddings --batch-sizes 1,8,32 --max-waits 0,2,5,10 --transport socket
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from embedding_service import BatchingEncoder, EmbeddingClient, EmbeddingServer, MODEL_NAME
+from benchmarks.fakes import HashingEncoder
+
+class SimulatedModel(HashingEncoder):
+    """Costs fixed_ms per encode() call plus per_text_ms per text, like a real model"""
+
+    def __init__(self, fixed_ms, per_text_ms):
+        super().__init__()
+        self.fixed = fixed_ms / 1000
+        self.per_text = per_text_ms / 1000
+
+    def encode(self, texts):
+        time.sleep(self.fixed + self.per_text * len(texts))
+        return super().encode(texts)
+
+def run_clients(encode_factory, clients, requests_per_client):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(index):
+        encode = encode_factory()
+        samples = []
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            encode([f"client {index} question {i}: how long does shipping take?"])
+            samples.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'texts_per_sec': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-sizes', default='1,4,16,32,64')
+    parser.add_argument('--max-waits', default='0,2,5,10', help='milliseconds')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent callers')
+    parser.add_argument('--requests', type=int, default=50, help='requests per client')
+    parser.add_argument('--transport', choices=['inproc', 'socket'], default='inproc')
+    parser.add_argument('--real', action='store_true', help=f'use {MODEL_NAME} instead of the simulated model')
+    parser.add_argument('--fixed-ms', type=float, default=8.0, help='simulated cost per encode() call')
+    parser.add_argument('--per-text-ms', type=float, default=0.4, help='simulated cost per text')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args()
+
+    if args.real:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(MODEL_NAME)
+    else:
+        model = SimulatedModel(args.fixed_ms, args.per_text_ms)
+
+    print(f"{args.clients} clients x {args.requests} requests, transport={args.transport}")
+    print(f"{'batch':>6} {'wait ms':>8} {'texts/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    results = []
+    for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+        for max_wait in (float(w) for w in args.max_waits.split(',')):
+            encoder = BatchingEncoder(model, max_batch_size=batch_size, max_wait_ms=max_wait)
+            if args.transport == 'socket':
+                socket_path = os.path.join(tempfile.mkdtemp(), 'embeddings.sock')
+                server = EmbeddingServer(socket_path, encoder)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                client = EmbeddingClient(socket_path)
+                stats = run_clients(lambda: client.encode, args.clients, args.requests)
+                server.shutdown()
+                server.server_close()
+            else:
+                stats = run_clients(lambda: encoder.encode, args.clients, args.requests)
+
+            stats.update(batch_size=batch_size, max_wait_ms=max_wait)
+            results.append(stats)
+            print(f"{batch_size:>6} {max_wait:>8g} {stats['texts_per_sec']:>10.0f} "
+                  f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""In-process fakes for the Gmail service object, the OpenAI client and the embedding model"""
+import hashlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+
+class FakeApiError(Exception):
+    """Raised by the fakes when an error is injected"""
+
+class LatencyModel:
+    """Sleeps for a jittered latency and fails a fraction of calls"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def apply(self, operation):
+        with self.lock:
+            delay = max(self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms), 0)
+            fail = self.rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            raise FakeApiError(f"Injected error in {operation}")
+
+class FakeRequest:
+    """Mimics googleapiclient's HttpRequest: nothing happens until execute()"""
+
+    def __init__(self, latency, operation, handler, observer=None):
+        self.latency = latency
+        self.operation = operation
+        self.handler = handler
+        self.observer = observer
+
+    def execute(self):
+        start = time.perf_counter()
+        try:
+            self.latency.apply(self.operation)
+            return self.handler()
+        finally:
+            if self.observer:
+                self.observer(self.operation, time.perf_counter() - start)
+
+class FakeGmailService:
+    """Serves a fixed stream of messages().get() payloads as an inbox.
+
+    Supports the calls GmailListener makes:
+    users().messages().list/get/modify/send(...).execute()
+    """
+
+    PAGE_SIZE = 100  # Gmail's default maxResults
+
+    def __init__(self, messages, latency=None, observer=None):
+        self.latency = latency or LatencyModel()
+        # Called with (operation, seconds) after every execute()
+        self.observer = observer
+        self.lock = threading.Lock()
+        self.inbox = {msg['id']: msg for msg in messages}
+        self.unread = [msg['id'] for msg in messages]
+        self.sent = []
+
+    def request(self, operation, handler):
+        return FakeRequest(self.latency, operation, handler, self.observer)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, userId, q=None, maxResults=PAGE_SIZE):
+        def handler():
+            with self.lock:
+                ids = self.unread[:maxResults]
+            return {'messages': [{'id': i, 'threadId': self.inbox[i]['threadId']} for i in ids]}
+        return self.request('messages.list', handler)
+
+    def get(self, userId, id):
+        return self.request('messages.get', lambda: self.inbox[id])
+
+    def modify(self, userId, id, body):
+        def handler():
+            if 'UNREAD' in body.get('removeLabelIds', []):
+                with self.lock:
+                    if id in self.unread:
+                        self.unread.remove(id)
+            return {'id': id}
+        return self.request('messages.modify', handler)
+
+    def send(self, userId, body):
+        def handler():
+            with self.lock:
+                self.sent.append(body)
+                return {'id': f'sent-{len(self.sent)}', 'threadId': body.get('threadId')}
+        return self.request('messages.send', handler)
+
+    def remaining(self):
+        with self.lock:
+            return len(self.unread)
+
+class FakeOpenAIClient:
+    """Answers chat.completions.create() with a canned reply after a delay"""
+
+    def __init__(self, latency=None, reply="Thank you for reaching out.\n\nBest regards, Customer Support Team"):
+        self.latency = latency or LatencyModel()
+        self.reply = reply
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, max_tokens=None, temperature=None):
+        self.latency.apply('chat.completions.create')
+        prompt_tokens = sum(len(message['content']) for message in messages) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=len(self.reply) // 4,
+                total_tokens=prompt_tokens + len(self.reply) // 4
+            )
+        )
+
+class HashingEncoder:
+    """Deterministic stand-in for SentenceTransformer.encode()"""
+
+    def __init__(self, dimensions=384):
+        self.dimensions = dimensions
+
+    def encode(self, texts):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.array(vectors)
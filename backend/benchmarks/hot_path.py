@@ -0,0 +1,141 @@
+"""Microbenchmarks for the per-email hot path.
+
+Runs offline on a generated corpus and writes machine-readable JSON.
+Run from backend/:
+
+    python -m benchmarks.hot_path --output baseline.json
+    python -m benchmarks.hot_path --compare baseline.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from agent import EmailAgent
+from email_listener import GmailListener
+from rag import SimpleRAG
+from benchmarks import corpus
+
+def bare(cls):
+    """Instance without running __init__.
+
+    The benchmarked methods are pure and need neither the Gmail service,
+    the OpenAI client, the embedding model nor the database.
+    """
+    return cls.__new__(cls)
+
+def build_cases(corpus_size, seed):
+    agent = bare(EmailAgent)
+    listener = bare(GmailListener)
+    rag = bare(SimpleRAG)
+
+    cases = {}
+    for kind in corpus.KINDS:
+        messages = corpus.generate(kind, corpus_size, seed)
+        payloads = [msg['payload'] for msg in messages]
+        bodies = [listener.parse_email(msg)['body'] for msg in messages]
+        cases[f'parse_email[{kind}]'] = (listener.parse_email, messages)
+        cases[f'get_message_body[{kind}]'] = (listener.get_message_body, payloads)
+        cases[f'categorize_email[{kind}]'] = (agent.categorize_email, bodies)
+        cases[f'extract_order_id[{kind}]'] = (agent.extract_order_id, bodies)
+        cases[f'find_answer[{kind}]'] = (rag.find_answer, bodies)
+    return cases
+
+def measure(func, inputs, rounds, min_round_time):
+    """Per-call nanoseconds for each round over the whole input set"""
+    # Repeat the input set enough times that one round is not timer noise
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            for item in inputs:
+                func(item)
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_round_time * 1e9:
+            break
+        loops *= 2
+
+    samples = []
+    calls = loops * len(inputs)
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            for item in inputs:
+                func(item)
+        samples.append((time.perf_counter_ns() - start) / calls)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        'median_ns': median,
+        'min_ns': samples[0],
+        'p95_ns': samples[max(int(len(samples) * 0.95) - 1, 0)],
+        'stdev_ns': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'ops_per_sec': 1e9 / median if median else 0.0,
+        'calls_per_round': calls,
+        'rounds': rounds,
+    }
+
+def compare(results, baseline, threshold):
+    """Print a comparison table and return the names that regressed"""
+    regressions = []
+    print(f"\n{'benchmark':40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:40} {'-':>12} {stats['median_ns']:>10.0f}ns {'new':>8}")
+            continue
+        change = stats['median_ns'] / base['median_ns'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:40} {base['median_ns']:>10.0f}ns {stats['median_ns']:>10.0f}ns {change:>+7.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus-size', type=int, default=200, help='messages per corpus kind')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rounds', type=int, default=15)
+    parser.add_argument('--min-round-time', type=float, default=0.05, help='seconds')
+    parser.add_argument('--filter', default='', help='only run benchmarks containing this text')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='median slowdown that counts as a regression (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    results = {}
+    for name, (func, inputs) in build_cases(args.corpus_size, args.seed).items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(func, inputs, args.rounds, args.min_round_time)
+        stats = results[name]
+        print(f"{name:40} median={stats['median_ns']:>9.0f}ns p95={stats['p95_ns']:>9.0f}ns ops/s={stats['ops_per_sec']:>11.0f}")
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpus_size': args.corpus_size,
+            'seed': args.seed,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""End-to-end replay load test with fake Gmail, OpenAI and embeddings.
+
+Pushes an email stream through main.poll_once() and EmailAgent.process_email()
+against a local Postgres and reports emails/sec and per-stage latency for
+each concurrency setting. Run from backend/ against a scratch database:
+
+    DB_NAME=email_agent_bench python -m benchmarks.loadtest --emails 2000 --concurrency 1,4,8
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from database import Database
+from email_listener import GmailListener
+from rag import SimpleRAG
+from agent import EmailAgent
+from openai_service import OpenAIService
+from main import poll_once
+from benchmarks import corpus
+from benchmarks.fakes import FakeGmailService, FakeOpenAIClient, HashingEncoder, LatencyModel
+
+# Share of each kind of email in the synthetic stream
+STREAM_MIX = {'short': 0.5, 'threaded': 0.2, 'multipart': 0.2, 'non_ascii': 0.1}
+
+# Methods timed as pipeline stages, by the object they live on
+AGENT_STAGES = {
+    'categorize_email': 'classify',
+    'extract_order_id': 'extract',
+    'assess_importance': 'importance',
+    'get_conversation_context': 'db',
+    'update_conversation_context': 'db',
+}
+DB_STAGES = ['get_order', 'mark_refund_requested', 'save_unhandled_email', 'save_not_found_refund']
+HISTORY_STAGES = ['load', 'append']
+OPENAI_STAGES = ['generate_question_response', 'generate_refund_response', 'generate_follow_up_response']
+
+class StageRecorder:
+    """Thread-safe collection of latency samples per stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, obj, method, stage):
+        func = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(obj, method, timed)
+
+    def summary(self):
+        report = {}
+        with self.lock:
+            for stage, samples in sorted(self.samples.items()):
+                ordered = sorted(samples)
+                report[stage] = {
+                    'count': len(ordered),
+                    'mean_ms': sum(ordered) / len(ordered) * 1000,
+                    'p50_ms': percentile(ordered, 50) * 1000,
+                    'p95_ms': percentile(ordered, 95) * 1000,
+                    'p99_ms': percentile(ordered, 99) * 1000,
+                }
+        return report
+
+def percentile(ordered, pct):
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+class PooledAgent:
+    """Fans poll_once()'s emails out to worker threads, one EmailAgent and DB connection each"""
+
+    def __init__(self, make_agent, concurrency, recorder):
+        self.make_agent = make_agent
+        self.recorder = recorder
+        self.executor = ThreadPoolExecutor(concurrency)
+        self.local = threading.local()
+        self.futures = []
+        self.errors = 0
+
+    def process_email(self, email):
+        self.futures.append(self.executor.submit(self._process, email))
+
+    def _process(self, email):
+        if not hasattr(self.local, 'agent'):
+            self.local.agent = self.make_agent()
+        start = time.perf_counter()
+        try:
+            self.local.agent.process_email(email)
+        finally:
+            self.recorder.record('total', time.perf_counter() - start)
+
+    def drain(self):
+        """Wait for every dispatched email, counting failures like main() would log them"""
+        for future in self.futures:
+            if future.exception():
+                self.errors += 1
+        self.futures = []
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+def synthetic_stream(count, seed):
+    rng = random.Random(seed)
+    pools = {kind: corpus.generate(kind, count, seed) for kind in STREAM_MIX}
+    kinds = rng.choices(list(STREAM_MIX), weights=list(STREAM_MIX.values()), k=count)
+    return [pools[kind][i] for i, kind in enumerate(kinds)]
+
+def load_stream(path):
+    """Recorded messages().get() payloads, one JSON object per line"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def tag_stream(stream, run):
+    """Give every message and thread a run-specific id so runs don't share conversation state"""
+    tagged = []
+    for msg in stream:
+        msg = dict(msg)
+        msg['id'] = f"{run}-{msg['id']}"
+        msg['threadId'] = f"{run}-{msg['threadId']}"
+        tagged.append(msg)
+    return tagged
+
+def run(stream, concurrency, args, run_id):
+    recorder = StageRecorder()
+    service = FakeGmailService(
+        tag_stream(stream, run_id),
+        latency=LatencyModel(args.gmail_latency_ms, args.gmail_jitter_ms, args.gmail_error_rate, args.seed),
+        observer=lambda operation, seconds: recorder.record(f'gmail.{operation}', seconds)
+    )
+    openai_client = FakeOpenAIClient(
+        latency=LatencyModel(args.openai_latency_ms, args.openai_jitter_ms, args.openai_error_rate, args.seed)
+    )
+    gmail = GmailListener(service=service)
+    recorder.wrap(gmail, 'get_unread_emails', 'gmail_fetch')
+    recorder.wrap(gmail, 'send_reply', 'send')
+    encoder = HashingEncoder()
+
+    def make_agent():
+        db = Database()
+        for method in DB_STAGES:
+            recorder.wrap(db, method, 'db')
+        rag = SimpleRAG(db, model=encoder)
+        recorder.wrap(rag, 'find_answer', 'rag')
+        openai = OpenAIService(client=openai_client)
+        for method in OPENAI_STAGES:
+            recorder.wrap(openai, method, 'openai')
+        agent = EmailAgent(db, rag, gmail, openai=openai)
+        for method, stage in AGENT_STAGES.items():
+            recorder.wrap(agent, method, stage)
+        for method in HISTORY_STAGES:
+            recorder.wrap(agent.history, method, 'db')
+        return agent
+
+    pool = PooledAgent(make_agent, concurrency, recorder)
+    # The agent print()s every reply; keep the report readable
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    processed = 0
+    polls = 0
+    with quiet:
+        while service.remaining():
+            processed += poll_once(gmail, pool)
+            pool.drain()
+            polls += 1
+            if polls > len(stream) * 2:
+                break  # Injected Gmail errors can stall the inbox; don't spin forever
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+
+    return {
+        'concurrency': concurrency,
+        'emails': processed,
+        # Marked read by a fetch that then failed, so never processed
+        'lost': len(stream) - processed - service.remaining(),
+        'errors': pool.errors,
+        'replies_sent': len(service.sent),
+        'polls': polls,
+        'seconds': elapsed,
+        'emails_per_sec': processed / elapsed if elapsed else 0.0,
+        'stages': recorder.summary(),
+    }
+
+def print_report(result):
+    print(f"\nconcurrency={result['concurrency']}: {result['emails']} emails in {result['seconds']:.1f}s "
+          f"= {result['emails_per_sec']:.1f} emails/s "
+          f"({result['errors']} errors, {result['lost']} lost, {result['replies_sent']} replies)")
+    print(f"  {'stage':28} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in result['stages'].items():
+        print(f"  {stage:28} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--emails', type=int, default=1000, help='size of the synthetic stream')
+    parser.add_argument('--replay', help='JSONL file of recorded messages().get() payloads')
+    parser.add_argument('--save-stream', help='write the stream used to this JSONL file')
+    parser.add_argument('--concurrency', default='1,4,8', help='comma separated worker counts')
+    parser.add_argument('--gmail-latency-ms', type=float, default=40)
+    parser.add_argument('--gmail-jitter-ms', type=float, default=20)
+    parser.add_argument('--gmail-error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-latency-ms', type=float, default=1200)
+    parser.add_argument('--openai-jitter-ms', type=float, default=600)
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--verbose', action='store_true', help="show the agent's own output")
+    args = parser.parse_args()
+
+    load_dotenv()
+    # OpenAIService.is_available() only checks that a key is configured
+    os.environ['OPENAI_API_KEY'] = 'sk-loadtest-fake'
+    logging.getLogger().setLevel(logging.WARNING)
+
+    stream = load_stream(args.replay) if args.replay else synthetic_stream(args.emails, args.seed)
+    if args.save_stream:
+        with open(args.save_stream, 'w') as f:
+            for msg in stream:
+                f.write(json.dumps(msg, ensure_ascii=False) + '\n')
+
+    Database().add_sample_data()
+
+    results = []
+    run_prefix = f'load{int(time.time())}'
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        result = run(stream, concurrency, args, f'{run_prefix}c{concurrency}')
+        print_report(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
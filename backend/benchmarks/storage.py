@@ -0,0 +1,146 @@
+"""Lookup latency benchmark for the partitioned audit and conversation tables.
+
+Fills the tables up to each requested scale and times the lookups the agent
+and operators run, to check latency stays flat as rows accumulate.
+Run from backend/ against a scratch database, never production:
+
+    DB_NAME=email_agent_bench python -m benchmarks.storage --scales 1000000,10000000,30000000
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from dotenv import load_dotenv
+from database import Database
+
+# Rows are spread over this many months so most of them land in old partitions
+HISTORY_MONTHS = 24
+
+LOOKUPS = {
+    'conversation_by_thread': (
+        "SELECT context FROM email_conversations WHERE thread_id = %s AND closed_at IS NULL",
+        lambda scale: (f'thread-{random.randrange(scale)}',)
+    ),
+    'recent_unhandled_by_importance': (
+        """
+        SELECT id, email_from, subject FROM unhandled_emails
+        WHERE importance = %s AND created_at >= CURRENT_TIMESTAMP - INTERVAL '7 days'
+        ORDER BY created_at DESC LIMIT 50
+        """,
+        lambda scale: (random.choice(['HIGH', 'NORMAL']),)
+    ),
+    'recent_unhandled_by_category': (
+        """
+        SELECT id, email_from, subject FROM unhandled_emails
+        WHERE category = %s AND created_at >= CURRENT_TIMESTAMP - INTERVAL '7 days'
+        ORDER BY created_at DESC LIMIT 50
+        """,
+        lambda scale: (random.choice(['QUESTION', 'OTHER']),)
+    ),
+    'not_found_refunds_by_sender': (
+        "SELECT order_id, created_at FROM not_found_refunds WHERE email_from = %s",
+        lambda scale: (f'customer{random.randrange(scale // 10 or 1)}@example.com',)
+    ),
+}
+
+def fill_to(db, scale, batch_size=1000000):
+    """Insert rows until every benchmarked table holds `scale` rows"""
+    with db.conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM email_conversations")
+        start = cur.fetchone()[0]
+        while start < scale:
+            end = min(start + batch_size, scale)
+            # Emails are spread uniformly over the history window
+            cur.execute("""
+                INSERT INTO unhandled_emails (email_from, subject, body, category, importance, created_at)
+                SELECT 'customer' || (i % 100000) || '@example.com',
+                       'Subject ' || i,
+                       repeat('Lorem ipsum dolor sit amet. ', 8),
+                       CASE WHEN i % 3 = 0 THEN 'QUESTION' ELSE 'OTHER' END,
+                       CASE WHEN i % 10 = 0 THEN 'HIGH' ELSE 'NORMAL' END,
+                       CURRENT_TIMESTAMP - (random() * %s * INTERVAL '30 days')
+                FROM generate_series(%s, %s) AS i
+            """, (HISTORY_MONTHS, start, end - 1))
+            cur.execute("""
+                INSERT INTO not_found_refunds (email_from, order_id, message, created_at)
+                SELECT 'customer' || (i / 10) || '@example.com',
+                       'ORD-' || lpad((i % 100000)::text, 5, '0'),
+                       'Please refund my order',
+                       CURRENT_TIMESTAMP - (random() * %s * INTERVAL '30 days')
+                FROM generate_series(%s, %s) AS i
+            """, (HISTORY_MONTHS, start, end - 1))
+            cur.execute("""
+                INSERT INTO email_conversations (thread_id, email_from, last_category, context, updated_at)
+                SELECT 'thread-' || i, 'customer' || (i % 100000) || '@example.com',
+                       'REFUND', 'awaiting_order_id',
+                       CURRENT_TIMESTAMP - (random() * %s * INTERVAL '30 days')
+                FROM generate_series(%s, %s) AS i
+                ON CONFLICT (thread_id) DO NOTHING
+            """, (HISTORY_MONTHS, start, end - 1))
+            print(f"  inserted rows {start}..{end - 1}")
+            start = end
+        for table in ('unhandled_emails', 'not_found_refunds', 'email_conversations'):
+            cur.execute(f"ANALYZE {table}")
+
+def time_lookups(db, scale, iterations):
+    """Return p50/p95/p99 latency in milliseconds for each lookup"""
+    results = {}
+    with db.conn.cursor() as cur:
+        for name, (query, make_params) in LOOKUPS.items():
+            samples = []
+            for _ in range(iterations):
+                params = make_params(scale)
+                start = time.perf_counter()
+                cur.execute(query, params)
+                cur.fetchall()
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            results[name] = {
+                'p50_ms': statistics.median(samples),
+                'p95_ms': samples[int(len(samples) * 0.95) - 1],
+                'p99_ms': samples[int(len(samples) * 0.99) - 1],
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='1000000,10000000,30000000',
+                        help='comma separated row counts to measure at')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--max-growth', type=float, default=2.0,
+                        help='fail if p95 at the largest scale exceeds this multiple of the smallest')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = Database()
+    db.ensure_partitions(months_back=HISTORY_MONTHS + 1)
+
+    scales = sorted(int(scale) for scale in args.scales.split(','))
+    report = {}
+    for scale in scales:
+        print(f"Filling to {scale} rows...")
+        fill_to(db, scale)
+        report[scale] = time_lookups(db, scale, args.iterations)
+        for name, stats in report[scale].items():
+            print(f"  {name:32} p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    flat = True
+    smallest, largest = report[scales[0]], report[scales[-1]]
+    for name in LOOKUPS:
+        growth = largest[name]['p95_ms'] / max(smallest[name]['p95_ms'], 0.001)
+        if growth > args.max_growth:
+            print(f"FAIL {name}: p95 grew {growth:.1f}x from {scales[0]} to {scales[-1]} rows")
+            flat = False
+    if flat:
+        print("Lookup latency stayed flat across scales")
+    sys.exit(0 if flat else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import re
+import json
+from typing import List, Tuple
+import metrics
+
+CUSTOMER = 'c'
+AGENT = 'a'
+ROLE_NAMES = {CUSTOMER: 'Customer', AGENT: 'Agent'}
+
+# Quoted earlier messages that mail clients append to replies
+QUOTE_HEADER = re.compile(r'^\s*On .+wrote:\s*$', re.MULTILINE)
+SIGNATURE = re.compile(r'\s*Best regards,.*$', re.DOTALL)
+GIST_CHARS = 120
+# Room for the opening gist plus at least one recent one
+MIN_SUMMARY_CHARS = 2 * GIST_CHARS
+
+def compact(text: str, limit: int) -> str:
+    """Drop quoted replies and signatures, collapse whitespace, cap length"""
+    match = QUOTE_HEADER.search(text)
+    if match:
+        text = text[:match.start()]
+    text = SIGNATURE.sub('', text)
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith('>')]
+    text = ' '.join(' '.join(lines).split())
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+def gist(text: str) -> str:
+    """First sentence of a turn, for the rolling summary"""
+    sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0]
+    return compact(sentence, GIST_CHARS)
+
+class ConversationHistory:
+    """Per-thread history stored on email_conversations.
+
+    Keeps the last max_turns turns as compact [role, text] pairs in the
+    history column. Older turns are folded into a rolling summary of their
+    first sentences, capped at summary_chars by dropping the middle while
+    keeping the opening message. Storage and prompt size per thread
+    therefore stay bounded however long the thread gets.
+    """
+
+    def __init__(self, db, max_turns=None, turn_chars=None, summary_chars=None):
+        self.db = db
+        self.max_turns = max_turns or int(os.getenv('CONVERSATION_MAX_TURNS', '6'))
+        self.turn_chars = turn_chars or int(os.getenv('CONVERSATION_TURN_CHARS', '500'))
+        self.summary_chars = summary_chars or int(os.getenv('CONVERSATION_SUMMARY_CHARS', '600'))
+        if self.summary_chars < MIN_SUMMARY_CHARS:
+            print(f"Warning: conversation summary limit {self.summary_chars} raised to {MIN_SUMMARY_CHARS}")
+            self.summary_chars = MIN_SUMMARY_CHARS
+
+    @metrics.timed_stage('db')
+    def load(self, thread_id: str) -> Tuple[str, List[List[str]]]:
+        """Return (summary, turns) for an open thread"""
+        with self.db.conn.cursor() as cur:
+            cur.execute(
+                "SELECT summary, history FROM email_conversations WHERE thread_id = %s AND closed_at IS NULL",
+                (thread_id,)
+            )
+            row = cur.fetchone()
+        if not row:
+            return '', []
+        return row[0] or '', row[1] or []
+
+    @metrics.timed_stage('db')
+    def append(self, thread_id: str, email_from: str, category: str, turns: List[Tuple[str, str]]):
+        """Add (role, text) turns, folding overflow into the summary"""
+        with self.db.conn.cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                # Lock the row so concurrent emails on one thread don't drop turns
+                cur.execute(
+                    "SELECT summary, history, closed_at FROM email_conversations WHERE thread_id = %s FOR UPDATE",
+                    (thread_id,)
+                )
+                row = cur.fetchone()
+                # A thread closed by retention starts over when it is reopened
+                if row and row[2] is None:
+                    summary, history = row[0] or '', row[1] or []
+                else:
+                    summary, history = '', []
+
+                history = history + [[role, compact(text, self.turn_chars)] for role, text in turns]
+                overflow, history = history[:-self.max_turns], history[-self.max_turns:]
+                if overflow:
+                    summary = self.fold(summary, overflow)
+
+                cur.execute("""
+                    INSERT INTO email_conversations (thread_id, email_from, last_category, summary, history)
+                    VALUES (%s, %s, %s, %s, %s::jsonb)
+                    ON CONFLICT (thread_id) DO UPDATE
+                    SET last_category = EXCLUDED.last_category,
+                        summary = EXCLUDED.summary,
+                        history = EXCLUDED.history,
+                        -- Drop a closed thread's stale flag, e.g. awaiting_order_id
+                        context = CASE WHEN email_conversations.closed_at IS NULL
+                                       THEN email_conversations.context END,
+                        updated_at = CURRENT_TIMESTAMP,
+                        closed_at = NULL
+                """, (thread_id, email_from, category, summary, json.dumps(history, ensure_ascii=False)))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def fold(self, summary: str, turns: List[List[str]]) -> str:
+        """Append the gist of each turn, capping the summary at summary_chars"""
+        parts = [summary] if summary else []
+        parts += [f"{ROLE_NAMES[role]}: {gist(text)}" for role, text in turns]
+        summary = ' | '.join(parts)
+        if len(summary) > self.summary_chars:
+            # Keep the opening message, which usually states the issue, and the latest gists
+            head = summary.split(' | ', 1)[0][:self.summary_chars // 2]
+            tail_chars = max(0, self.summary_chars - len(head) - len(' | ...'))
+            summary = f"{head} | ...{summary[-tail_chars:]}" if tail_chars else head
+        return summary
+
+    def format(self, summary: str, turns: List[List[str]]) -> str:
+        """Render history for a prompt"""
+        lines = []
+        if summary:
+            lines.append(f"Earlier in the conversation (summary): {summary}")
+        lines += [f"{ROLE_NAMES[role]}: {text}" for role, text in turns]
+        return '\n'.join(lines)
@@ -1,7 +1,48 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from datetime import datetime, date
 import os
+import metrics
+
+# Audit tables are append-only and range-partitioned by month on created_at,
+# so retention can detach/drop whole partitions instead of running DELETEs.
+AUDIT_TABLES = {
+    'unhandled_emails': {
+        'columns': """
+            email_from VARCHAR(255),
+            subject TEXT,
+            body TEXT,
+            category VARCHAR(50),
+            importance VARCHAR(20)
+        """,
+        # (filter, created_at, id) so triage can keyset-paginate newest first
+        'indexes': {
+            'idx_unhandled_emails_category_recent': '(category, created_at, id)',
+            'idx_unhandled_emails_importance_recent': '(importance, created_at, id)',
+            'idx_unhandled_emails_recent': '(created_at, id)',
+        },
+    },
+    'not_found_refunds': {
+        'columns': """
+            email_from VARCHAR(255),
+            order_id VARCHAR(100),
+            message TEXT
+        """,
+        'indexes': {
+            'idx_not_found_refunds_email': '(email_from)',
+            'idx_not_found_refunds_recent': '(created_at, id)',
+        },
+    },
+}
+
+ARCHIVE_SCHEMA = 'archive'
+
+
+def month_start(day, offset=0):
+    """First day of the month `offset` months away from `day`"""
+    month_index = day.year * 12 + day.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
 
 class Database:
     def __init__(self):
@@ -34,28 +75,34 @@ class Database:
                 )
             """)
             
-            # Unhandled emails table
+            # Partitioned audit tables (unhandled emails, not found refunds)
+            for table in AUDIT_TABLES:
+                self.create_audit_table(cur, table)
+            
+            # Superseded by the (filter, created_at, id) indexes below
+            cur.execute("DROP INDEX IF EXISTS idx_unhandled_emails_category, idx_unhandled_emails_importance")
+            for table, spec in AUDIT_TABLES.items():
+                for index, columns in spec['indexes'].items():
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} {columns}")
+            
+            # Triage counters, refreshed periodically so dashboards never COUNT(*)
             cur.execute("""
-                CREATE TABLE IF NOT EXISTS unhandled_emails (
-                    id SERIAL PRIMARY KEY,
-                    email_from VARCHAR(255),
-                    subject TEXT,
-                    body TEXT,
-                    category VARCHAR(50),
-                    importance VARCHAR(20),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+                CREATE MATERIALIZED VIEW IF NOT EXISTS triage_counts AS
+                SELECT 'unhandled_emails' AS source,
+                       COALESCE(category, 'NONE') AS category,
+                       COALESCE(importance, 'NONE') AS importance,
+                       COUNT(*) AS total,
+                       CURRENT_TIMESTAMP AS refreshed_at
+                FROM unhandled_emails
+                GROUP BY 1, 2, 3
+                UNION ALL
+                SELECT 'not_found_refunds', 'REFUND', 'NONE', COUNT(*), CURRENT_TIMESTAMP
+                FROM not_found_refunds
             """)
-            
-            # Not found refund requests
+            # Unique index required for REFRESH ... CONCURRENTLY
             cur.execute("""
-                CREATE TABLE IF NOT EXISTS not_found_refunds (
-                    id SERIAL PRIMARY KEY,
-                    email_from VARCHAR(255),
-                    order_id VARCHAR(100),
-                    message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_triage_counts_key
+                ON triage_counts(source, category, importance)
             """)
             
             # Knowledge base for RAG
@@ -90,19 +137,252 @@ class Database:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            # Stale threads are closed by the retention job instead of deleted
+            cur.execute("ALTER TABLE email_conversations ADD COLUMN IF NOT EXISTS closed_at TIMESTAMP")
+            # Bounded structured history, see conversation.ConversationHistory
+            cur.execute("ALTER TABLE email_conversations ADD COLUMN IF NOT EXISTS summary TEXT")
+            cur.execute("ALTER TABLE email_conversations ADD COLUMN IF NOT EXISTS history JSONB")
             
             # Create indexes for performance
             cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id)")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_unhandled_emails_category ON unhandled_emails(category)")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_unhandled_emails_importance ON unhandled_emails(importance)")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_conversations_thread_id ON email_conversations(thread_id)")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_not_found_refunds_email ON not_found_refunds(email_from)")
+            # thread_id is already covered by its UNIQUE index; the duplicate
+            # only added write and vacuum cost
+            cur.execute("DROP INDEX IF EXISTS idx_conversations_thread_id")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversations_open_updated_at
+                ON email_conversations(updated_at) WHERE closed_at IS NULL
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversations_closed_at
+                ON email_conversations(closed_at) WHERE closed_at IS NOT NULL
+            """)
+        
+        try:
+            self.ensure_partitions()
+        except Exception as e:
+            # A missed roll-forward must not stop startup or the retention job
+            print(f"Warning: could not create audit partitions: {e}")
+    
+    def create_audit_table(self, cur, table):
+        """Create a monthly partitioned audit table, migrating a plain one in place"""
+        spec = AUDIT_TABLES[table]
+        cur.execute("""
+            SELECT c.relkind FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relname = %s AND n.nspname = current_schema()
+        """, (table,))
+        row = cur.fetchone()
+        kind = row[0] if row else None
+        
+        if kind == 'p':
+            # Already partitioned
+            return
+        
+        cur.execute("BEGIN")
+        try:
+            if kind == 'r':
+                # Original unpartitioned table from an older schema: move it
+                # aside, keeping its id sequence so ids stay unique
+                legacy = f'{table}_legacy'
+                cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+                cur.execute(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {legacy}_pkey")
+                cur.execute(f"ALTER TABLE {legacy} ALTER COLUMN id DROP DEFAULT")
+                cur.execute(f"ALTER SEQUENCE IF EXISTS {table}_id_seq OWNED BY NONE")
+            
+            cur.execute(f"CREATE SEQUENCE IF NOT EXISTS {table}_id_seq")
+            cur.execute(f"""
+                CREATE TABLE {table} (
+                    id INTEGER NOT NULL DEFAULT nextval('{table}_id_seq'),
+                    {spec['columns'].strip()},
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, created_at)
+                ) PARTITION BY RANGE (created_at)
+            """)
+            cur.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+            # Catch-all for rows outside the pre-created monthly ranges
+            cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+            
+            if kind == 'r':
+                cur.execute(f"SELECT MIN(created_at) FROM {legacy}")
+                oldest = cur.fetchone()[0]
+                if oldest:
+                    self.create_partitions(cur, table, month_start(oldest), month_start(date.today(), 1))
+                # The partition key must not be NULL
+                cur.execute(f"UPDATE {legacy} SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+                cur.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+                cur.execute(f"DROP TABLE {legacy}")
+            
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        
+        if kind == 'r':
+            print(f"Migrated {table} to monthly partitions")
+    
+    def create_partitions(self, cur, table, first_month, last_month):
+        """Create monthly partitions of `table` covering first_month..last_month"""
+        month = first_month
+        while month <= last_month:
+            self.create_partition(cur, table, month)
+            month = month_start(month, 1)
+    
+    def create_partition(self, cur, table, month):
+        """Create the partition of `table` for `month` if it is missing.
+        
+        Rows for that month may already sit in the default partition (when
+        partitions were not rolled forward in time), which would make the
+        CREATE fail. They are moved into the new partition instead. Runs
+        inside the caller's transaction.
+        """
+        partition = f'{table}_p{month:%Y%m}'
+        cur.execute("SELECT to_regclass(%s)", (partition,))
+        if cur.fetchone()[0]:
+            return
+        
+        next_month = month_start(month, 1)
+        bounds = f"FOR VALUES FROM ('{month}') TO ('{next_month}')"
+        in_range = "created_at >= %s AND created_at < %s"
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {in_range})", (month, next_month))
+        if not cur.fetchone()[0]:
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} {bounds}")
+            return
+        
+        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {table}_default")
+        cur.execute(f"CREATE TABLE {partition} PARTITION OF {table} {bounds}")
+        cur.execute(f"INSERT INTO {partition} SELECT * FROM {table}_default WHERE {in_range}", (month, next_month))
+        moved = cur.rowcount
+        cur.execute(f"DELETE FROM {table}_default WHERE {in_range}", (month, next_month))
+        cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT")
+        print(f"Moved {moved} rows of {table} from the default partition to {partition}")
+    
+    def ensure_partitions(self, months_ahead=2, months_back=0):
+        """Make sure audit partitions exist around the current month, and for
+        any month with rows left in the default partition"""
+        today = date.today()
+        with self.conn.cursor() as cur:
+            for table in AUDIT_TABLES:
+                # One transaction per table, so a failed move leaves the default partition attached
+                cur.execute("BEGIN")
+                try:
+                    cur.execute(f"SELECT DISTINCT date_trunc('month', created_at)::date FROM {table}_default")
+                    for (month,) in cur.fetchall():
+                        self.create_partition(cur, table, month)
+                    self.create_partitions(
+                        cur,
+                        table,
+                        month_start(today, -months_back),
+                        month_start(today, months_ahead)
+                    )
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+    
+    def expire_partitions(self, retention_months, archive=True):
+        """Detach audit partitions older than the retention window.
+        
+        Detached partitions are moved to the archive schema, or dropped
+        when archive is False. An existing archive table is never replaced;
+        the partition stays attached instead. Returns the names of expired
+        partitions.
+        """
+        cutoff = month_start(date.today(), -retention_months)
+        expired = []
+        
+        with self.conn.cursor() as cur:
+            if archive:
+                cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            
+            for table in AUDIT_TABLES:
+                cur.execute("""
+                    SELECT child.relname FROM pg_inherits i
+                    JOIN pg_class parent ON parent.oid = i.inhparent
+                    JOIN pg_class child ON child.oid = i.inhrelid
+                    JOIN pg_namespace n ON n.oid = parent.relnamespace
+                    WHERE parent.relname = %s AND n.nspname = current_schema()
+                """, (table,))
+                
+                for (partition,) in cur.fetchall():
+                    suffix = partition[len(table) + 2:]
+                    if not partition.startswith(f'{table}_p') or not suffix.isdigit():
+                        continue  # default partition
+                    month = date(int(suffix[:4]), int(suffix[4:]), 1)
+                    if month >= cutoff:
+                        continue
+                    
+                    # One transaction per partition, so a failure leaves it
+                    # attached and the next run retries it
+                    cur.execute("BEGIN")
+                    try:
+                        if archive:
+                            cur.execute("SELECT to_regclass(%s)", (f'{ARCHIVE_SCHEMA}.{partition}',))
+                            if cur.fetchone()[0]:
+                                raise RuntimeError(
+                                    f"{ARCHIVE_SCHEMA}.{partition} already exists; "
+                                    f"move or drop it before {partition} can be archived"
+                                )
+                        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {partition}")
+                        if archive:
+                            cur.execute(f"ALTER TABLE {partition} SET SCHEMA {ARCHIVE_SCHEMA}")
+                        else:
+                            cur.execute(f"DROP TABLE {partition}")
+                        cur.execute("COMMIT")
+                    except Exception as e:
+                        cur.execute("ROLLBACK")
+                        print(f"Warning: could not expire partition {partition}: {e}")
+                        continue
+                    expired.append(partition)
+                
+                # ensure_partitions normally moves these into monthly partitions first
+                cur.execute(f"SELECT COUNT(*) FROM {table}_default WHERE created_at < %s", (cutoff,))
+                stale = cur.fetchone()[0]
+                if stale:
+                    print(f"Warning: {stale} rows in {table}_default are past retention; "
+                          f"they are expired once ensure_partitions moves them to monthly partitions")
+        
+        return expired
+    
+    def refresh_triage_counts(self):
+        """Recompute the triage counters without blocking readers"""
+        with self.conn.cursor() as cur:
+            cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY triage_counts")
+    
+    def close_stale_conversations(self, stale_days):
+        """Close open conversations with no activity for stale_days"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE email_conversations
+                SET closed_at = CURRENT_TIMESTAMP
+                WHERE closed_at IS NULL
+                  AND updated_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+            """, (stale_days,))
+            return cur.rowcount
+    
+    def purge_closed_conversations(self, purge_days, batch_size=10000):
+        """Delete conversations closed more than purge_days ago, in batches"""
+        deleted = 0
+        with self.conn.cursor() as cur:
+            while True:
+                cur.execute("""
+                    DELETE FROM email_conversations
+                    WHERE id IN (
+                        SELECT id FROM email_conversations
+                        WHERE closed_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                        LIMIT %s
+                    )
+                """, (purge_days, batch_size))
+                deleted += cur.rowcount
+                if cur.rowcount < batch_size:
+                    return deleted
     
+    @metrics.timed_stage('db')
     def get_order(self, order_id):
         with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("SELECT * FROM orders WHERE order_id = %s", (order_id,))
             return cur.fetchone()
     
+    @metrics.timed_stage('db')
     def mark_refund_requested(self, order_id):
         with self.conn.cursor() as cur:
             cur.execute(
@@ -110,6 +390,7 @@ class Database:
                 (order_id,)
             )
     
+    @metrics.timed_stage('db')
     def save_unhandled_email(self, email_from, subject, body, category, importance):
         with self.conn.cursor() as cur:
             cur.execute("""
@@ -117,6 +398,7 @@ class Database:
                 VALUES (%s, %s, %s, %s, %s)
             """, (email_from, subject, body, category, importance))
     
+    @metrics.timed_stage('db')
     def save_not_found_refund(self, email_from, order_id, message):
         with self.conn.cursor() as cur:
             cur.execute("""
@@ -1,21 +1,142 @@
 import pickle
 import os
+import json
+import logging
+import threading
+import httplib2
+from datetime import datetime, timedelta
+from functools import lru_cache
+from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 import base64
 import time
 from email.mime.text import MIMEText
+import metrics
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
+logger = logging.getLogger(__name__)
+
+# Tokens are refreshed in the background this long before they expire
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+TOKEN_CHECK_INTERVAL = 60  # seconds
+
+_shared_http = None
+
+@lru_cache(maxsize=None)
+def gmail_discovery_document():
+    """Gmail v1 discovery document bundled with google-api-python-client, parsed once"""
+    return json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+
+def shared_http():
+    """One keep-alive HTTP transport reused by every listener in the process.
+    
+    Like httplib2 itself this is not thread-safe; listeners are polled from
+    the main loop.
+    """
+    global _shared_http
+    if _shared_http is None:
+        _shared_http = httplib2.Http(timeout=60)
+    return _shared_http
+
+class LockedAuthorizedHttp(AuthorizedHttp):
+    """AuthorizedHttp holding the account's credentials lock for each request,
+    so it never reads or refreshes creds while the refresher updates them"""
+    
+    def __init__(self, credentials, lock, http=None):
+        super().__init__(credentials, http=http)
+        self.lock = lock
+    
+    def request(self, *args, **kwargs):
+        # Reentrant: request() recurses after refreshing on a 401
+        with self.lock:
+            return super().request(*args, **kwargs)
+
+class TokenRefresher:
+    """Background thread refreshing OAuth tokens before they expire,
+    so refreshes don't happen at startup or inside a poll.
+    
+    Accounts whose refresh token was rejected (revoked or invalid) are
+    listed in needs_reauth until a refresh succeeds again.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.accounts = {}
+        self.needs_reauth = set()
+        self.wakeup = threading.Event()
+        self.thread = None
+    
+    def register(self, account_name, creds, token_file):
+        """Start refreshing an account's creds; returns the lock guarding them"""
+        creds_lock = threading.RLock()
+        with self.lock:
+            self.accounts[account_name] = (creds, token_file, creds_lock)
+            self.needs_reauth.discard(account_name)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='token-refresher', daemon=True)
+                self.thread.start()
+        self.wakeup.set()  # Check the new account right away
+        return creds_lock
+    
+    def run(self):
+        while True:
+            with self.lock:
+                accounts = list(self.accounts.items())
+            for account_name, (creds, token_file, creds_lock) in accounts:
+                with creds_lock:
+                    self.refresh_if_needed(account_name, creds, token_file)
+            self.wakeup.wait(TOKEN_CHECK_INTERVAL)
+            self.wakeup.clear()
+    
+    def refresh_if_needed(self, account_name, creds, token_file):
+        # Credentials.expiry is a naive UTC datetime; None means it never expires
+        if not creds.refresh_token or creds.expiry is None:
+            return
+        if creds.expiry - datetime.utcnow() > TOKEN_REFRESH_MARGIN:
+            return
+        try:
+            creds.refresh(Request())
+        except RefreshError as e:
+            self.record_failure(account_name, e, rejected=True)
+            return
+        except Exception as e:
+            # Network errors and the like; retried on the next check
+            self.record_failure(account_name, e, rejected=False)
+            return
+        
+        self.needs_reauth.discard(account_name)
+        print(f"Token refreshed for account: {account_name}")
+        try:
+            with open(token_file, 'wb') as token:
+                pickle.dump(creds, token)
+        except OSError as e:
+            # The refreshed token is still used in memory; only a restart would lose it
+            logger.error(f"Could not save refreshed token for {account_name} to {token_file}: {e}")
+    
+    def record_failure(self, account_name, error, rejected):
+        metrics.TOKEN_REFRESH_ERRORS.inc(account=account_name, reason='rejected' if rejected else 'error')
+        if rejected:
+            self.needs_reauth.add(account_name)
+            logger.error(f"Token refresh rejected for {account_name}, re-authentication required: {error}")
+        else:
+            logger.error(f"Token refresh failed for {account_name}: {error}")
+
+token_refresher = TokenRefresher()
+
 class GmailListener:
-    def __init__(self, account_name='default'):
+    def __init__(self, account_name='default', service=None):
         self.account_name = account_name
         self.token_file = f'token_{account_name}.pickle' if account_name != 'default' else 'token.pickle'
-        self.service = None
-        self.authenticate()
+        # An already built service (e.g. a test fake) skips OAuth entirely
+        self.service = service
+        if self.service is None:
+            self.authenticate()
     
     def authenticate(self):
         creds = None
@@ -24,56 +145,77 @@ class GmailListener:
             with open(self.token_file, 'rb') as token:
                 creds = pickle.load(token)
         
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                    print(f"Token refreshed for account: {self.account_name}")
-                except Exception as e:
-                    print(f"Token refresh failed for {self.account_name}: {e}")
-                    creds = None
-            
-            if not creds:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES)
-                creds = flow.run_local_server(port=0)
-                print(f"New authentication completed for account: {self.account_name}")
+        # Expired tokens with a refresh token are left to the background
+        # refresher; only accounts that can't refresh need the browser flow
+        if not creds or not (creds.valid or creds.refresh_token):
+            flow = InstalledAppFlow.from_client_secrets_file(
+                'credentials.json', SCOPES)
+            creds = flow.run_local_server(port=0)
+            print(f"New authentication completed for account: {self.account_name}")
             
             with open(self.token_file, 'wb') as token:
                 pickle.dump(creds, token)
         
-        self.service = build('gmail', 'v1', credentials=creds)
+        creds_lock = token_refresher.register(self.account_name, creds, self.token_file)
+        
+        # No discovery fetch and no new connection pool per listener
+        self.service = build_from_document(
+            gmail_discovery_document(),
+            http=LockedAuthorizedHttp(creds, creds_lock, http=shared_http())
+        )
+    
+    @property
+    def needs_reauth(self):
+        """True once Google has rejected this account's refresh token"""
+        return self.account_name in token_refresher.needs_reauth
     
     def get_unread_emails(self):
         """Get unread emails from inbox"""
+        if self.needs_reauth:
+            metrics.GMAIL_ERRORS.inc(operation='auth')
+            logger.error(
+                f"Gmail account {self.account_name} needs re-authentication: "
+                f"delete {self.token_file} and restart to sign in again"
+            )
+            return []
+        
         try:
-            results = self.service.users().messages().list(
-                userId='me',
-                q='is:unread label:INBOX'
-            ).execute()
+            with metrics.GMAIL_SECONDS.time(operation='list'):
+                results = self.service.users().messages().list(
+                    userId='me',
+                    q='is:unread label:INBOX'
+                ).execute()
             
             messages = results.get('messages', [])
             emails = []
             
             for message in messages:
-                msg = self.service.users().messages().get(
-                    userId='me', 
-                    id=message['id']
-                ).execute()
+                with metrics.GMAIL_SECONDS.time(operation='get'):
+                    msg = self.service.users().messages().get(
+                        userId='me', 
+                        id=message['id']
+                    ).execute()
                 
                 # Parse email
                 email_data = self.parse_email(msg)
                 emails.append(email_data)
                 
                 # Mark as read
-                self.service.users().messages().modify(
-                    userId='me',
-                    id=message['id'],
-                    body={'removeLabelIds': ['UNREAD']}
-                ).execute()
+                with metrics.GMAIL_SECONDS.time(operation='modify'):
+                    self.service.users().messages().modify(
+                        userId='me',
+                        id=message['id'],
+                        body={'removeLabelIds': ['UNREAD']}
+                    ).execute()
             
             return emails
+        except RefreshError as e:
+            # Refreshed inline after a 401 and Google rejected the token
+            token_refresher.record_failure(self.account_name, e, rejected=True)
+            metrics.GMAIL_ERRORS.inc(operation='auth')
+            return []
         except Exception as e:
+            metrics.GMAIL_ERRORS.inc(operation='fetch')
             print(f"Error getting emails: {e}")
             return []
     
@@ -127,13 +269,19 @@ class GmailListener:
         
         return body
     
+    @staticmethod
+    def can_reply(to_email):
+        """False for noreply and invalid addresses, which never get replies"""
+        return not ('noreply' in to_email.lower() or 
+                    'no-reply' in to_email.lower() or
+                    'unknown' in to_email.lower() or
+                    not '@' in to_email)
+    
+    @metrics.timed_stage('send')
     def send_reply(self, to_email, subject, body, thread_id=None):
         """Send reply email"""
         # Don't reply to noreply addresses or invalid emails
-        if ('noreply' in to_email.lower() or 
-            'no-reply' in to_email.lower() or
-            'unknown' in to_email.lower() or
-            not '@' in to_email):
+        if not self.can_reply(to_email):
             print(f"Skipping reply to: {to_email} (noreply/invalid address)")
             return False
             
@@ -149,12 +297,14 @@ class GmailListener:
             send_message['threadId'] = thread_id
         
         try:
-            self.service.users().messages().send(
-                userId='me', 
-                body=send_message
-            ).execute()
+            with metrics.GMAIL_SECONDS.time(operation='send'):
+                self.service.users().messages().send(
+                    userId='me', 
+                    body=send_message
+                ).execute()
             print(f"Reply sent to: {to_email}")
             return True
         except Exception as e:
+            metrics.GMAIL_ERRORS.inc(operation='send')
             print(f"Error sending email to {to_email}: {e}")
             return False
\ No newline at end of file
@@ -0,0 +1,187 @@
+import os
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+import socketserver
+from concurrent.futures import Future
+import numpy as np
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+DEFAULT_SOCKET = '/tmp/email_agent_embeddings.sock'
+
+class BatchingEncoder:
+    """Collects concurrent encode() calls into micro-batches for one model.
+
+    A batch is sent to the model once it holds max_batch_size texts or the
+    oldest request has waited max_wait_ms, whichever comes first. Requests
+    already queued are always included, so max_wait_ms=0 still batches
+    under load without delaying a lone request.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name='embedding-batcher', daemon=True)
+        self.worker.start()
+
+    def encode(self, texts):
+        """Same contract as SentenceTransformer.encode(list) -> 2D array"""
+        future = Future()
+        self.requests.put((list(texts), future))
+        return future.result()
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Past the deadline, still take whatever is already queued
+                    if remaining > 0:
+                        request = self.requests.get(timeout=remaining)
+                    else:
+                        request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            self.encode_batch(batch)
+
+    def encode_batch(self, batch):
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            vectors = np.asarray(self.model.encode(texts))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for request_texts, future in batch:
+            future.set_result(vectors[start:start + len(request_texts)])
+            start += len(request_texts)
+
+# Wire format, both directions: 4-byte big-endian length + JSON header,
+# followed on responses by the raw float32 vectors
+
+def send_message(sock, header, payload=b''):
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data + payload)
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Embedding service closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def recv_header(sock):
+    (size,) = struct.unpack('>I', recv_exact(sock, 4))
+    return json.loads(recv_exact(sock, size))
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # One connection serves many requests from the same client thread
+        while True:
+            try:
+                request = recv_header(self.request)
+            except (ConnectionError, struct.error):
+                return
+            try:
+                vectors = self.server.encoder.encode(request['texts']).astype(np.float32)
+                send_message(self.request, {'shape': list(vectors.shape)}, vectors.tobytes())
+            except Exception as e:
+                send_message(self.request, {'error': str(e)})
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """Serves one BatchingEncoder to every worker process over a Unix socket"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, encoder):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.encoder = encoder
+        super().__init__(socket_path, EmbeddingRequestHandler)
+
+class EmbeddingClient:
+    """Drop-in for SentenceTransformer.encode() backed by the embedding service"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.socket_path = socket_path
+        # A connection per thread, so concurrent callers can be batched together
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'sock', None) is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            self.local.sock = sock
+        return self.local.sock
+
+    def encode(self, texts):
+        sock = self.connection()
+        try:
+            send_message(sock, {'texts': list(texts)})
+            header = recv_header(sock)
+            if 'error' in header:
+                raise RuntimeError(f"Embedding service error: {header['error']}")
+            shape = header['shape']
+            payload = recv_exact(sock, int(np.prod(shape)) * 4)
+        except (OSError, ConnectionError):
+            # Reconnect on the next call, e.g. after a service restart
+            sock.close()
+            self.local.sock = None
+            raise
+        return np.frombuffer(payload, dtype=np.float32).reshape(shape)
+
+_local_encoder = None
+_local_encoder_lock = threading.Lock()
+
+def get_encoder():
+    """Encoder for this process: the shared service if EMBEDDING_SOCKET is set,
+    otherwise one batched local model shared by every caller in the process"""
+    global _local_encoder
+    socket_path = os.getenv('EMBEDDING_SOCKET')
+    if socket_path:
+        return EmbeddingClient(socket_path)
+
+    with _local_encoder_lock:
+        if _local_encoder is None:
+            from sentence_transformers import SentenceTransformer
+            _local_encoder = BatchingEncoder(
+                SentenceTransformer(MODEL_NAME),
+                max_batch_size=int(os.getenv('EMBEDDING_MAX_BATCH', '32')),
+                max_wait_ms=float(os.getenv('EMBEDDING_MAX_WAIT_MS', '2'))
+            )
+        return _local_encoder
+
+def main():
+    from dotenv import load_dotenv
+    from sentence_transformers import SentenceTransformer
+
+    load_dotenv()
+    socket_path = os.getenv('EMBEDDING_SOCKET', DEFAULT_SOCKET)
+    encoder = BatchingEncoder(
+        SentenceTransformer(MODEL_NAME),
+        max_batch_size=int(os.getenv('EMBEDDING_MAX_BATCH', '32')),
+        max_wait_ms=float(os.getenv('EMBEDDING_MAX_WAIT_MS', '2'))
+    )
+    with EmbeddingServer(socket_path, encoder) as server:
+        print(f"Embedding service listening on {socket_path}")
+        server.serve_forever()
+
+if __name__ == "__main__":
+    main()
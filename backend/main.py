@@ -1,11 +1,16 @@
 import time
 import os
+import signal
 import logging
+import threading
 from dotenv import load_dotenv
 from database import Database
 from email_listener import GmailListener
 from rag import SimpleRAG
 from agent import EmailAgent
+from retention import run_retention
+from metrics import POLL_SECONDS, start_metrics_server
+from profiler import SamplingProfiler
 
 load_dotenv()
 
@@ -20,6 +25,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Set to profile the next poll cycle (PROFILE_POLL=1 at startup, or SIGUSR1)
+profile_requested = threading.Event()
+
+def poll_once(gmail, agent):
+    """Fetch unread emails and process them, returning how many were handled"""
+    with POLL_SECONDS.time():
+        emails = gmail.get_unread_emails()
+        
+        for email in emails:
+            logger.info(f"Processing email from {email['from']}: {email['subject']}")
+            agent.process_email(email)
+    
+    if emails:
+        logger.info(f"Processed {len(emails)} emails")
+    
+    return len(emails)
+
+def profile_poll(gmail, agent):
+    """Run one poll cycle under the sampling profiler and dump the result"""
+    with SamplingProfiler() as profiler:
+        poll_once(gmail, agent)
+    
+    path = os.path.join(os.getenv('PROFILE_DIR', 'profiles'), f"poll_{time.strftime('%Y%m%d_%H%M%S')}.collapsed")
+    profiler.dump(path)
+    logger.info(f"Poll profile ({profiler.samples} samples) written to {path}")
+    for function, share in profiler.top():
+        logger.info(f"  {share:6.1%}  {function}")
+
+def run_periodically(name, interval, job, initial_delay=0):
+    """Run job(db) every interval seconds on a daemon thread.
+    
+    The job gets its own database connection, so slow maintenance queries
+    never hold up polling. Failures are logged and retried next interval.
+    """
+    def loop():
+        db = None
+        time.sleep(initial_delay)
+        while True:
+            try:
+                if db is None:
+                    db = Database()
+                job(db)
+            except Exception as e:
+                logger.error(f"{name} failed: {e}")
+                if db is not None:
+                    db.conn.close()
+                    db = None  # Reconnect on the next run
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=loop, name=name, daemon=True)
+    thread.start()
+    return thread
+
 def main():
     logger.info("Starting Email Agent...")
     
@@ -31,19 +89,41 @@ def main():
         rag = SimpleRAG(db)
         agent = EmailAgent(db, rag, gmail)
         
+        metrics_port = int(os.getenv('METRICS_PORT', '9108'))
+        if metrics_port:
+            start_metrics_server(metrics_port, os.getenv('METRICS_HOST', '127.0.0.1'))
+            logger.info(f"Metrics available at http://{os.getenv('METRICS_HOST', '127.0.0.1')}:{metrics_port}/metrics")
+        
+        if os.getenv('PROFILE_POLL') == '1':
+            profile_requested.set()
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: profile_requested.set())
+        
+        # Partition roll-forward and retention (0 leaves it to cron)
+        retention_interval = int(os.getenv('RETENTION_INTERVAL_SECONDS', '86400'))
+        if retention_interval:
+            run_periodically('retention', retention_interval, run_retention)
+        
+        # Triage counters scan every audit partition, so refresh them rarely
+        triage_refresh_interval = int(os.getenv('TRIAGE_REFRESH_SECONDS', '1800'))
+        if triage_refresh_interval:
+            run_periodically(
+                'triage refresh',
+                triage_refresh_interval,
+                lambda db: db.refresh_triage_counts(),
+                initial_delay=triage_refresh_interval
+            )
+        
         logger.info("Email Agent is running. Listening for new emails...")
         
         # Main loop - check for new emails every 30 seconds
         while True:
             try:
-                emails = gmail.get_unread_emails()
-                
-                for email in emails:
-                    logger.info(f"Processing email from {email['from']}: {email['subject']}")
-                    agent.process_email(email)
-                
-                if emails:
-                    logger.info(f"Processed {len(emails)} emails")
+                if profile_requested.is_set():
+                    profile_requested.clear()
+                    profile_poll(gmail, agent)
+                else:
+                    poll_once(gmail, agent)
                 
                 time.sleep(30)  # Check every 30 seconds
                 
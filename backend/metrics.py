@@ -0,0 +1,198 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from sub-millisecond DB calls to slow LLM replies
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Labels of the email currently being processed (e.g. category), per thread
+_current_labels = contextvars.ContextVar('metric_labels', default={})
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    kind = None
+    suffix = ''
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self):
+        # Counters are exposed as <name>_total, and HELP/TYPE must use the same name
+        name = self.name + self.suffix
+        lines = [f'# HELP {name} {self.help_text}', f'# TYPE {name} {self.kind}']
+        with self.lock:
+            for values, state in sorted(self.series.items()):
+                lines.extend(self.render_series(values, state))
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+    suffix = '_total'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render_series(self, values, total):
+        return [f'{self.name}{self.suffix}{format_labels(self.labelnames, values)} {total}']
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.series.get(key)
+            if state is None:
+                state = self.series[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            # Counts are per bucket here and made cumulative when rendered
+            state['buckets'][bisect.bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render_series(self, values, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['buckets']):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{format_labels(self.labelnames, values, [("le", bound)])} {cumulative}')
+        lines.append(f'{self.name}_bucket{format_labels(self.labelnames, values, [("le", "+Inf")])} {state["count"]}')
+        lines.append(f'{self.name}_sum{format_labels(self.labelnames, values)} {state["sum"]}')
+        lines.append(f'{self.name}_count{format_labels(self.labelnames, values)} {state["count"]}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'email_agent_stage_seconds',
+    'Time spent in each processing stage',
+    ['stage', 'category']
+))
+EMAIL_SECONDS = REGISTRY.register(Histogram(
+    'email_agent_email_seconds',
+    'End-to-end processing time per email',
+    ['category', 'outcome']
+))
+EMAILS = REGISTRY.register(Counter(
+    'email_agent_emails',
+    'Emails processed, by category and outcome (llm, template, unsent, unhandled, error)',
+    ['category', 'outcome']
+))
+ORDERS = REGISTRY.register(Counter(
+    'email_agent_order_lookups',
+    'Refund order ID lookups, by result (found, not_found, missing)',
+    ['result']
+))
+ROUTES = REGISTRY.register(Counter(
+    'email_agent_routes',
+    'Reply routing decisions, by case and route (template, llm, escalate)',
+    ['case', 'route']
+))
+GMAIL_SECONDS = REGISTRY.register(Histogram(
+    'email_agent_gmail_seconds',
+    'Gmail API call latency',
+    ['operation']
+))
+GMAIL_ERRORS = REGISTRY.register(Counter(
+    'email_agent_gmail_errors',
+    'Failed Gmail API operations',
+    ['operation']
+))
+TOKEN_REFRESH_ERRORS = REGISTRY.register(Counter(
+    'email_agent_token_refresh_errors',
+    'Failed OAuth token refreshes, by account and reason (rejected, error)',
+    ['account', 'reason']
+))
+POLL_SECONDS = REGISTRY.register(Histogram(
+    'email_agent_poll_seconds',
+    'Duration of one poll cycle, fetch and processing included'
+))
+
+@contextmanager
+def email_labels(**labels):
+    """Attach labels (e.g. category) to every stage timed inside the block"""
+    token = _current_labels.set({**_current_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _current_labels.reset(token)
+
+def timed_stage(stage):
+    """Decorator recording a call's duration in STAGE_SECONDS"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                category = _current_labels.get().get('category', 'none')
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, category=category)
+        return wrapper
+    return decorator
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the log
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve /metrics in Prometheus text format from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
@@ -2,14 +2,16 @@ import os
 import openai
 from typing import Optional, Dict
 import json
+import metrics
 
 class OpenAIService:
-    def __init__(self):
-        self.client = openai.OpenAI(
+    def __init__(self, client=None):
+        self.client = client or openai.OpenAI(
             api_key=os.getenv('OPENAI_API_KEY')
         )
         self.model = "gpt-3.5-turbo"
     
+    @metrics.timed_stage('openai')
     def generate_question_response(self, question: str, knowledge_base_info: str = None) -> Optional[str]:
         """Generate response for customer questions"""
         try:
@@ -54,6 +56,7 @@ class OpenAIService:
             print(f"OpenAI API error in question response: {e}")
             return None
     
+    @metrics.timed_stage('openai')
     def generate_refund_response(self, context: str, order_id: str = None, order_found: bool = None) -> Optional[str]:
         """Generate response for refund requests"""
         try:
@@ -93,6 +96,7 @@ class OpenAIService:
             print(f"OpenAI API error in refund response: {e}")
             return None
     
+    @metrics.timed_stage('openai')
     def generate_follow_up_response(self, conversation_history: str, latest_message: str) -> Optional[str]:
         """Generate follow-up responses for complex conversations"""
         try:
@@ -1,11 +1,14 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from typing import List, Tuple
+from embedding_service import get_encoder
+import metrics
 
 class SimpleRAG:
-    def __init__(self, db):
+    def __init__(self, db, model=None):
         self.db = db
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Anything with a SentenceTransformer-style encode() can be passed in;
+        # by default the model is shared per process or via the embedding service
+        self.model = model or get_encoder()
         self.load_knowledge_base()
     
     def load_knowledge_base(self):
@@ -35,6 +38,7 @@ class SimpleRAG:
         
         try:
             with self.db.conn.cursor() as cur:
+                missing = []
                 for question, answer in sample_qas:
                     # Check if already exists
                     cur.execute(
@@ -42,7 +46,12 @@ class SimpleRAG:
                         (question,)
                     )
                     if not cur.fetchone():
-                        embedding = self.model.encode([question])[0]
+                        missing.append((question, answer))
+                
+                if missing:
+                    # One batch instead of one encode() per question
+                    embeddings = self.model.encode([question for question, _ in missing])
+                    for (question, answer), embedding in zip(missing, embeddings):
                         cur.execute("""
                             INSERT INTO knowledge_base (question, answer, embedding)
                             VALUES (%s, %s, %s)
@@ -52,6 +61,7 @@ class SimpleRAG:
             print(f"Warning: Could not load knowledge base: {e}")
             print("The agent will still work but questions may not be answered")
     
+    @metrics.timed_stage('rag')
     def find_answer(self, query: str, threshold: float = 0.7) -> Tuple[str, float]:
         """Find answer using simple keyword matching as fallback"""
         # Simple keyword-based matching for reliability
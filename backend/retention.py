@@ -0,0 +1,32 @@
+import os
+import logging
+from dotenv import load_dotenv
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+def get_bool_env(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes')
+
+def run_retention(db):
+    """Roll audit partitions forward, expire old ones and close stale threads"""
+    retention_months = int(os.getenv('RETENTION_MONTHS', '12'))
+    archive = get_bool_env('RETENTION_ARCHIVE', True)
+    stale_days = int(os.getenv('CONVERSATION_STALE_DAYS', '30'))
+    purge_days = int(os.getenv('CONVERSATION_PURGE_DAYS', '180'))
+
+    db.ensure_partitions()
+
+    expired = db.expire_partitions(retention_months, archive=archive)
+    if expired:
+        action = 'Archived' if archive else 'Dropped'
+        logger.info(f"{action} {len(expired)} audit partitions: {', '.join(expired)}")
+
+    closed = db.close_stale_conversations(stale_days)
+    purged = db.purge_closed_conversations(purge_days)
+    logger.info(f"Closed {closed} stale conversations, purged {purged} closed conversations")
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    run_retention(Database())
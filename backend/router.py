@@ -0,0 +1,66 @@
+import os
+import metrics
+
+TEMPLATE = 'template'
+LLM = 'llm'
+ESCALATE = 'escalate'
+
+# Customer questions, routed on knowledge base confidence
+QUESTION = 'question'
+
+# Fixed refund situations; only cases listed in ROUTER_LLM_CASES go to the LLM
+REFUND_CASES = (
+    'refund_request',            # First refund email without an order ID
+    'refund_missing_order_id',   # Still no order ID after we asked for it
+    'refund_approved',
+    'refund_order_not_found',
+    'refund_order_not_found_repeat',
+)
+
+class ResponseRouter:
+    """Decides whether a reply comes from a template, the LLM or a human.
+
+    Questions are routed on retrieval confidence: a decisive knowledge base
+    match is answered from the template, a weaker one goes to the LLM, and
+    anything at or below the LLM threshold (by default: no match) is
+    escalated. Fixed cases such as
+    "refund approved" use templates unless listed in llm_cases.
+    """
+
+    def __init__(self, template_min_confidence=None, llm_min_confidence=None, llm_cases=None):
+        self.template_min_confidence = float(
+            template_min_confidence if template_min_confidence is not None
+            else os.getenv('ROUTER_TEMPLATE_MIN_CONFIDENCE', '0.85')
+        )
+        self.llm_min_confidence = float(
+            llm_min_confidence if llm_min_confidence is not None
+            else os.getenv('ROUTER_LLM_MIN_CONFIDENCE', '0.0')
+        )
+        if llm_cases is None:
+            llm_cases = [case.strip() for case in os.getenv('ROUTER_LLM_CASES', 'refund_request,refund_order_not_found_repeat').split(',')]
+        self.llm_cases = set(case for case in llm_cases if case)
+        unknown = self.llm_cases - set(REFUND_CASES)
+        if unknown:
+            print(f"Warning: unknown router cases ignored: {', '.join(sorted(unknown))}")
+
+    def route(self, case: str, llm_available: bool, confidence: float = 0.0) -> str:
+        """Pick a route for a reply; confidence only applies to questions"""
+        if case == QUESTION:
+            return self.route_question(llm_available, confidence)
+        if case in self.llm_cases and llm_available:
+            return LLM
+        return TEMPLATE
+
+    def record(self, case: str, route: str):
+        """Count the route a reply actually took, after any LLM fallback"""
+        metrics.ROUTES.inc(case=case, route=route)
+
+    def route_question(self, llm_available: bool, confidence: float) -> str:
+        if confidence >= self.template_min_confidence:
+            return TEMPLATE
+        if llm_available and confidence > self.llm_min_confidence:
+            return LLM
+        # Without the LLM a weaker knowledge base match still beats no reply
+        if not llm_available and confidence > 0:
+            return TEMPLATE
+        return ESCALATE
@@ -1,6 +1,9 @@
 import streamlit as st
 import pickle
 import os
+import threading
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -56,4 +59,150 @@ if st.session_state.connected_accounts:
             if st.button(f"Disconnect", key=f"disc_{account}"):
                 disconnect_gmail(account)
 else:
-    st.info("No accounts connected yet")
\ No newline at end of file
+    st.info("No accounts connected yet")
+
+# Triage dashboard
+TRIAGE_SOURCES = {
+    'Unhandled emails': {
+        'table': 'unhandled_emails',
+        'columns': 'id, email_from, subject, category, importance, created_at',
+        'body': 'body',
+        'filters': ('category', 'importance'),
+    },
+    'Refunds with unknown order': {
+        'table': 'not_found_refunds',
+        'columns': "id, email_from, order_id AS subject, 'REFUND' AS category, NULL AS importance, created_at",
+        'body': 'message',
+        'filters': (),
+    },
+}
+PAGE_SIZE = 25
+
+@st.cache_resource
+def get_db_pool():
+    """One small pool per server process, shared by every browser session"""
+    size = int(os.getenv('DB_POOL_SIZE', '4'))
+    pool = ThreadedConnectionPool(
+        1, size,
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'email_agent'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'password')
+    )
+    # Sessions wait for a free connection instead of failing when the pool is busy
+    return pool, threading.BoundedSemaphore(size)
+
+def run_query(query, params=()):
+    """Run a read query on a pooled connection, returning it right after"""
+    pool, slots = get_db_pool()
+    with slots:
+        conn = pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params)
+                return cur.fetchall()
+        finally:
+            pool.putconn(conn)
+
+@st.cache_data(ttl=30)
+def load_triage_counts():
+    return run_query("SELECT * FROM triage_counts ORDER BY source, category, importance")
+
+@st.cache_data(ttl=15)
+def load_triage_page(source, category, importance, after):
+    """Keyset page, newest first; `after` is the (created_at, id) of the last row shown"""
+    spec = TRIAGE_SOURCES[source]
+    conditions = []
+    params = []
+    if category and 'category' in spec['filters']:
+        conditions.append("category = %s")
+        params.append(category)
+    if importance and 'importance' in spec['filters']:
+        conditions.append("importance = %s")
+        params.append(importance)
+    if after:
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    # One extra row tells us whether there is a next page
+    rows = run_query(f"""
+        SELECT {spec['columns']} FROM {spec['table']}
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, (*params, PAGE_SIZE + 1))
+    return rows[:PAGE_SIZE], len(rows) > PAGE_SIZE
+
+@st.cache_data(ttl=600)
+def load_triage_body(source, row_id, created_at):
+    spec = TRIAGE_SOURCES[source]
+    # created_at lets Postgres prune to a single partition
+    rows = run_query(
+        f"SELECT {spec['body']} AS body FROM {spec['table']} WHERE id = %s AND created_at = %s",
+        (row_id, created_at)
+    )
+    return rows[0]['body'] if rows else None
+
+st.header("Triage")
+
+try:
+    counts = load_triage_counts()
+except Exception as e:
+    st.error(f"Could not connect to the database: {e}")
+    counts = None
+
+if counts is not None:
+    if counts:
+        st.caption(f"Counters as of {counts[0]['refreshed_at']:%Y-%m-%d %H:%M:%S}")
+        unhandled = [row for row in counts if row['source'] == 'unhandled_emails']
+        refunds = sum(row['total'] for row in counts if row['source'] == 'not_found_refunds')
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Unhandled", sum(row['total'] for row in unhandled))
+        col2.metric("High importance", sum(row['total'] for row in unhandled if row['importance'] == 'HIGH'))
+        col3.metric("Unknown order refunds", refunds)
+    
+    source = st.selectbox("Source", list(TRIAGE_SOURCES))
+    filters = TRIAGE_SOURCES[source]['filters']
+    col1, col2 = st.columns(2)
+    with col1:
+        category = st.selectbox("Category", ['', 'QUESTION', 'OTHER'], disabled='category' not in filters)
+    with col2:
+        importance = st.selectbox("Importance", ['', 'HIGH', 'NORMAL'], disabled='importance' not in filters)
+    
+    # Stack of page cursors; reset whenever the filters change
+    view = (source, category, importance)
+    if st.session_state.get('triage_view') != view:
+        st.session_state.triage_view = view
+        st.session_state.triage_cursors = [None]
+        st.session_state.triage_loaded = set()
+    
+    after = st.session_state.triage_cursors[-1]
+    rows, has_next = load_triage_page(source, category, importance, after)
+    
+    if not rows:
+        st.info("Nothing to triage")
+    for row in rows:
+        label = f"{row['created_at']:%Y-%m-%d %H:%M} | {row['email_from']} | {row['subject']}"
+        if row['importance'] == 'HIGH':
+            label = f"[HIGH] {label}"
+        with st.expander(label):
+            body_key = (source, row['id'], row['created_at'])
+            # Bodies are only fetched once the operator asks for them
+            if body_key in st.session_state.triage_loaded:
+                st.text(load_triage_body(*body_key))
+            elif st.button("Load message", key=f"body_{source}_{row['id']}_{row['created_at']}"):
+                st.session_state.triage_loaded.add(body_key)
+                st.rerun()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Previous", disabled=len(st.session_state.triage_cursors) == 1):
+            st.session_state.triage_cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Next", disabled=not has_next):
+            last = rows[-1]
+            st.session_state.triage_cursors.append((last['created_at'], last['id']))
+            st.rerun()